@@ -3,6 +3,7 @@ import requests
 import py3Dmol
 import pickle
 import redis
+import numpy as np
 from tqdm import tqdm
 import matplotlib.pyplot as plt
 from cloudmol.cloudmol import PymolFold
@@ -105,9 +106,14 @@ def save_best_docking_result(docking_code ,file_path):
         #     f.write(receptor.read())
     return f"Docking result saved as {file_path}"
 
-def redis_writer(key, data):
+# Shared client; its connection pool keeps TCP connections open across calls
+redis_client = redis.Redis(
+    connection_pool=redis.ConnectionPool(host='localhost', port=6379, db=0, max_connections=16)
+)
+
+def redis_writer(key, data, client=None):
     # Serialize the Python object using pickle
-    r = redis.Redis(host='localhost', port=6379, db=0)  
+    r = client or redis_client
     # First, check redis service
     try: 
         r.ping()
@@ -122,9 +128,58 @@ def redis_writer(key, data):
     except:
         print("Error in redis_writer")
 
-def redis_reader(key):
+def redis_table_writer(key, smiles, table, client=None):
+    # Save a numpy structured array as a redis hash: a JSON schema header,
+    # the smiles of each row and the packed column data
+    r = client or redis_client
+    # First, check redis service
+    try: 
+        r.ping()
+    except:
+        print("Redis is out of service")
+        return None
+
+    try:
+        schema = {"columns": table.dtype.descr, "rows": len(table)}
+        pipe = r.pipeline(transaction=False)
+        pipe.delete(key)
+        pipe.hset(key, mapping={
+            "schema": json.dumps(schema),
+            "smiles": json.dumps(list(smiles)),
+            "data": table.tobytes(),
+        })
+        pipe.execute()
+        return len(table)
+    except:
+        print("Error in redis_table_writer")
+        return None
+
+def redis_table_reader(key, client=None):
+    # Rebuild the rows saved by redis_table_writer as a list of dicts
+    r = client or redis_client
+    # First, check redis service
+    try: 
+        r.ping()
+    except:
+        print("Redis is out of service")
+        return None
+
+    try:
+        schema, smiles, data = r.hmget(key, "schema", "smiles", "data")
+        schema = json.loads(schema)
+        dtype = np.dtype([tuple(column) for column in schema["columns"]])
+        table = np.frombuffer(data, dtype=dtype, count=schema["rows"])
+        return [
+            {"Molecule": smi, **dict(zip(dtype.names, values))}
+            for smi, values in zip(json.loads(smiles), table.tolist())
+        ]
+    except:
+        print("Error in redis_table_reader. Check the key!")
+        return None
+
+def redis_reader(key, client=None):
     # Retrieve the serialized object from Redis
-    r = redis.Redis(host='localhost', port=6379, db=0)
+    r = client or redis_client
     # First, check redis service
     try: 
         r.ping()
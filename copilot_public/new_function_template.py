@@ -1,7 +1,46 @@
 import json
-import types
+import functools
+import itertools
 import unitymol_zmq
+from chatmol_fn import redis_reader, redis_table_reader, redis_table_writer
+from mol_props import compute_props_table, mol_from_smiles
+from rdkit import Chem
+from rdkit.Chem import AllChem, MACCSkeys, Crippen
+from rdkit.Chem.QED import properties
+from rdkit.DataStructs import BulkTanimotoSimilarity
+try:
+    from seqfold import fold, dot_bracket
+except ImportError:  # seqfold is optional, only needed for RNA folding
+    fold = dot_bracket = None
+
+# Functions offered to the copilot; add new ones with @register
+_REGISTRY = []
+
+
+def register(func):
+    _REGISTRY.append(func)
+    return func
+
+
+# Capping patterns and fragments used by capped(), compiled once
+_BACKBONE = Chem.MolFromSmarts("NC[C:1](=[O:2])-[OD1]")
+_CP_NH2 = Chem.MolFromSmarts("NC")
+_CP_COOH = Chem.MolFromSmarts("[C:1](=[O:2])-N")
+_ACE_MOL = Chem.MolFromSmiles("CC(=O)N")
+_METHYL_MOL = Chem.MolFromSmiles("NC")
+
+
+# Standard genetic code, codons enumerated in TCAG order
+_CODON = {
+    "".join(codon): aa
+    for codon, aa in zip(
+        itertools.product("TCAG", repeat=3),
+        "FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG",
+    )
+}
+
 
+@register
 def execute_unitymol_command(self, command: str):
 
     try:
@@ -15,6 +54,7 @@ def execute_unitymol_command(self, command: str):
         return f"Command '{command}' failed with error {e} and feedback {result}"        
 
 
+@register
 def load_protein_into_unitymol(self, protein_pdb_id: str):
 
     try:
@@ -28,23 +68,25 @@ def load_protein_into_unitymol(self, protein_pdb_id: str):
         return f"Fetch('{protein_pdb_id}') failed with error {e} and feedback {result}"        
 
 
+@register
 def translate_to_protein(self, seq: str, pname=None):
-    from Bio.Seq import Seq
-
-    nucleotide_seq = Seq(seq)
-    protein_seq = nucleotide_seq.translate()
+    # Unknown codons become X and a trailing partial codon is dropped,
+    # as Bio.Seq.translate does
+    nucleotide_seq = seq.upper().replace("U", "T")
+    protein_seq = "".join(
+        _CODON.get(nucleotide_seq[i:i + 3], "X")
+        for i in range(0, len(nucleotide_seq) - 2, 3)
+    )
     if pname:
         return f"The protein sequence of {seq} is `>{pname}\n{protein_seq}`"
     else:
         return f"The protein sequence of {seq} is `>protein\n{protein_seq}`"
 
 
+@register
 def get_smiles_feature(self, smiles):
-    from rdkit import Chem
-    from rdkit.Chem.QED import properties
-    
     try:
-        mol = Chem.MolFromSmiles(smiles)
+        mol = mol_from_smiles(smiles)
     except:
         return "Error: Not a valid SMILES string"
     p = properties(mol)
@@ -60,129 +102,113 @@ def get_smiles_feature(self, smiles):
     return formatted_result
 
 
+@register
 def calculate_mol_properties(self, smiles_key):
-    from rdkit import Chem
-    from rdkit.Chem.QED import properties
-    from chatmol_fn import redis_reader, redis_writer
-
     smiles_list = redis_reader(smiles_key)
-    
-    results = []
-    for smiles in smiles_list:
-        try:
-            mol = Chem.MolFromSmiles(smiles)
-        except:
-            return "Error: Not a valid SMILES string"
-        p = properties(mol)
-        result_dict = {
-            "Molecule": smiles, 
-            "Molecular Weight": float(f"{p.MW:.2f}"), 
-            "LOGP": float(f"{p.ALOGP:.2f}"), 
-            "HBA (Hydrogen Bond Acceptors)": p.HBA, 
-            "HBD (Hydrogen Bond Donors)": p.HBD, 
-            "PSA (Polar Surface Area)": float(f"{p.PSA:.2f}"), 
-            "ROTB (Rotatable Bonds)": p.ROTB, 
-            "AROM (Aromatic Rings)": p.AROM
-        }
-        results.append(result_dict)
+
+    table = compute_props_table(smiles_list)
+    if table is None:
+        return "Error: Not a valid SMILES string"
     # Save the results into redis cache
     redis_key = "mol_property_table"
-    redis_writer(redis_key,results)
-    # Convert to string!
-    return f"molecule property table has been saved to redis cache with a redis key: {redis_key} \\n" + str(results)
+    if redis_table_writer(redis_key, smiles_list, table) is None:
+        return "Error: Could not save the molecule property table to redis cache"
+    return (
+        f"molecule property table ({len(table)} rows, columns: Molecule, "
+        f"{', '.join(table.dtype.names)}) has been saved to redis cache with a redis key: {redis_key}; "
+        f"use read_mol_property_table to see its rows"
+    )
 
+@register
 def capped(self, smiles):
     """ cap one amino acid """
-    from rdkit import Chem
-    def update_idx(removed, current):
-        if current>removed:
-            current -= 1
-        return current
-    
     try:
-        mol = Chem.MolFromSmiles(smiles)
+        mol = Chem.Mol(mol_from_smiles(smiles))
     except:
         return "Error: Not a valid SMILES string"
     
-    acetyl_smiles = "CC(=O)N"
-    methyl_amide_smiles = "NC"
     m_idx =  0
-    ace_mol = Chem.MolFromSmiles(acetyl_smiles)
-    methyl_mol = Chem.MolFromSmiles(methyl_amide_smiles)
+    combined_mol = Chem.CombineMols(mol, _ACE_MOL)
+    combined_mol = Chem.CombineMols(combined_mol, _METHYL_MOL)
+
+    # Only the first backbone match is used, so stop the search there
+    bb_match = combined_mol.GetSubstructMatches(
+        _BACKBONE, uniquify=False, useChirality=False, maxMatches=1
+    )[0]
+    OH, C1, NH2 = bb_match[-1], bb_match[-3], bb_match[0]
+    METH = combined_mol.GetSubstructMatches(_CP_NH2)[-1][m_idx]
+    ACE = combined_mol.GetSubstructMatches(_CP_COOH)[-1][-1]
     
-    combined_mol = Chem.CombineMols(mol,ace_mol)
-    combined_mol = Chem.CombineMols(combined_mol, methyl_mol)
-
-    backbone_matches = "NC[C:1](=[O:2])-[OD1]"
-    backbone = Chem.MolFromSmarts(backbone_matches)
-    
-    cp_nh2 = Chem.MolFromSmarts(methyl_amide_smiles)
-    cp_cooh = Chem.MolFromSmarts('[C:1](=[O:2])-N')
-    OH = combined_mol.GetSubstructMatches(backbone)[0][-1]
-    C1 = combined_mol.GetSubstructMatches(backbone)[0][-3]
-    NH2 = combined_mol.GetSubstructMatches(backbone)[0][0]
-    METH = combined_mol.GetSubstructMatches(cp_nh2)[-1][m_idx]
-    ACE = combined_mol.GetSubstructMatches(cp_cooh)[-1][-1]
-    
-    capped_mol = Chem.EditableMol(combined_mol)
-    capped_mol.RemoveAtom(OH)
-    C1 = update_idx(OH,C1)
-    NH2 = update_idx(OH,NH2)
-    METH = update_idx(OH,METH)
-    ACE = update_idx(OH,ACE)
+    # Add all bonds against the original indices, then delete the leaving
+    # atoms highest index first so no index needs shifting
+    capped_mol = Chem.RWMol(combined_mol)
+    connected = [a.GetIdx() for a in capped_mol.GetAtomWithIdx(NH2).GetNeighbors()]
     capped_mol.AddBond(C1, METH, order=Chem.rdchem.BondType.SINGLE)
-
-    bonds = capped_mol.GetMol().GetBonds()
-    connected = []
-    for bond in bonds:
-        if bond.GetBeginAtom().GetIdx() == NH2:
-            connected.append(bond.GetEndAtom().GetIdx()-1 \
-                            if bond.GetEndAtom().GetIdx()>NH2 \
-                            else bond.GetEndAtom().GetIdx())
-        elif bond.GetEndAtom().GetIdx() == NH2:
-            connected.append(bond.GetBeginAtom().GetIdx()-1 \
-                            if bond.GetBeginAtom().GetIdx()>NH2 \
-                            else bond.GetBeginAtom().GetIdx())
-            
-    capped_mol.RemoveAtom(NH2)
-    ACE = update_idx(NH2,ACE)
     for conn in connected:
         capped_mol.AddBond(conn, ACE, order=Chem.rdchem.BondType.SINGLE)
+    for idx in sorted([OH, NH2], reverse=True):
+        capped_mol.RemoveAtom(idx)
     capped_smi = Chem.MolToSmiles(capped_mol.GetMol())
     return f"After capping (adding ace and nme), the smiles is `{capped_smi}`"
 
 
+# Fingerprint builders keyed by type; unknown types fall back to ECFP
+_FP_DISPATCH = {
+    "ECFP": lambda m: AllChem.GetMorganFingerprintAsBitVect(m, 2, nBits=2048),
+    "FCFP": lambda m: AllChem.GetMorganFingerprintAsBitVect(
+        m, 2, nBits=2048, useFeatures=True, useChirality=True
+    ),
+    "RDK": AllChem.RDKFingerprint,
+    "MACC": MACCSkeys.GenMACCSKeys,
+}
+
+
+def _get_fingerprint(smiles, types):
+    return _FP_DISPATCH.get(types, _FP_DISPATCH["ECFP"])(mol_from_smiles(smiles))
+
+
+def _bulk_similarity(query_smiles, target_smiles_list, types):
+    """ Tanimoto of one query against many targets in a single RDKit call """
+    fp_query = _get_fingerprint(query_smiles, types)
+    fp_list = [_get_fingerprint(smiles, types) for smiles in target_smiles_list]
+    return BulkTanimotoSimilarity(fp_query, fp_list)
+
+
+@functools.lru_cache(maxsize=4096)
+def _canonical_smiles(smiles):
+    mol = mol_from_smiles(smiles)
+    return None if mol is None else Chem.MolToSmiles(mol)
+
+
+def _invalid_smiles(smiles_list):
+    return [smiles for smiles in smiles_list if mol_from_smiles(smiles) is None]
+
+
+@register
 def smiles_similarity(self, smiles1, smiles2, types="ECFP"):
-    from rdkit import Chem
-    from rdkit.Chem import AllChem
-    from rdkit.Chem import MACCSkeys
-    from rdkit.DataStructs import TanimotoSimilarity
-    
-    def get_fingerprint(smiles, types):
-        try:
-            molecule = Chem.MolFromSmiles(smiles)
-        except:
-            return "Error: Not a valid SMILES string"
-        # ECFP
-        fp = AllChem.GetMorganFingerprint(molecule, 2)
-        if types == "FCFP":
-            fp = AllChem.GetMorganFingerprint(
-                                    molecule, 2,
-                                    useFeatures=True,
-                                    useChirality=True
-                                    )            
-        elif types == "RDK":
-            fp = AllChem.RDKFingerprint(molecule)
-        elif types == "MACC":
-            fp = MACCSkeys.GenMACCSKeys(molecule)
-        return fp
-
-    fp1, fp2 = get_fingerprint(smiles1,types), get_fingerprint(smiles2,types)
-    similarity = TanimotoSimilarity(fp1, fp2)
-    
+    invalid = _invalid_smiles([smiles1, smiles2])
+    if invalid:
+        return f"Error: Not a valid SMILES string: {', '.join(invalid)}"
+    # Same molecule means identical fingerprints, so skip the Tanimoto
+    if smiles1 == smiles2 or _canonical_smiles(smiles1) == _canonical_smiles(smiles2):
+        return f"Using {types} fingerprint and Tanimoto, the result is 1.00"
+    similarity = _bulk_similarity(smiles1, [smiles2], types)[0]
     return f"Using {types} fingerprint and Tanimoto, the result is {similarity:.2f}"
 
 
+@register
+def smiles_similarity_bulk(self, query_smiles, target_smiles_list, types="ECFP"):
+    invalid = _invalid_smiles([query_smiles, *target_smiles_list])
+    if invalid:
+        return f"Error: Not a valid SMILES string: {', '.join(invalid)}"
+    similarities = _bulk_similarity(query_smiles, target_smiles_list, types)
+    formatted_result = ", ".join(
+        f"{smiles}: {similarity:.2f}"
+        for smiles, similarity in zip(target_smiles_list, similarities)
+    )
+    return f"Using {types} fingerprint and Tanimoto, the results are {formatted_result}"
+
+
 function_descriptions = [{ # This is the description of the function
     "type": "function",
     "function": {
@@ -245,9 +271,10 @@ function_descriptions = [{ # This is the description of the function
     "type": "function",
     "function": {
         "name": "calculate_mol_properties",
-        "description": "Calculate properties for a list of smiles started in Redis cache, and will return a list of molecular \
-                        properties, including weight, logp, HBA(Hydrogen Bond Acceptors), HBD(Hydrogen Bond Donors) \
-                        PSA(Polar Surface Area) values, ROTB(Rotatable Bonds) and AROM(Aromatic Rings)",
+        "description": "Calculate properties for a list of smiles started in Redis cache, and will save a table of molecular \
+                        properties to Redis cache and return its redis key. Properties include weight, logp, HBA(Hydrogen Bond Acceptors), HBD(Hydrogen Bond Donors) \
+                        PSA(Polar Surface Area) values, ROTB(Rotatable Bonds) and AROM(Aromatic Rings). \
+                        Use read_mol_property_table to read the values back",
         "parameters": {
             "type": "object",
             "properties": {
@@ -290,6 +317,29 @@ function_descriptions = [{ # This is the description of the function
         },
         "required": ["smiles1", "smiles2"],
     }
+},
+{
+    "type": "function",
+    "function": {
+        "name": "smiles_similarity_bulk",
+        "description": "Input one query smiles, a list of target smiles and a fingerprint \
+                        method (if not provided, ECFP - the default morgan fingerprint \
+                        will be used) and return the TanimotoSimilarity of the query \
+                        to each target",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query_smiles": {"type": "string", "description": "The query smiles sequence"},
+                "target_smiles_list": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "The smiles sequences to compare against",
+                },
+                "types": {"type": "string", "description": "The fingerprint method"},
+            },
+        },
+        "required": ["query_smiles", "target_smiles_list"],
+    }
 }]
 
 test_data = {
@@ -345,12 +395,21 @@ test_data = {
             "smiles2": "N[C@@H](CS)C(=O)O",
         },
         "output": "Using ECFP fingerprint and Tanimoto, the result is 1.00",
+    },
+    "smiles_similarity_bulk": {
+        "input": {
+            "self": None,
+            "query_smiles": "N[C@@H](CS)C(=O)O",
+            "target_smiles_list": ["N[C@@H](CS)C(=O)O", "N[C@@H](C)C(=O)O"],
+        },
+        "output": "Using ECFP fingerprint and Tanimoto, the results are N[C@@H](CS)C(=O)O: 1.00, \
+N[C@@H](C)C(=O)O: 0.40",
     }
 }
 
 
+@register
 def predict_rna_secondary_structure(self, rna_seq: str):
-    from seqfold import fold, dg, dot_bracket
     """
     Predict the secondary structure of an RNA sequence using the seqfold library.
 
@@ -360,8 +419,12 @@ def predict_rna_secondary_structure(self, rna_seq: str):
     Returns:
     - A dictionary with the minimum free energy and the dot-bracket representation of the structure.
     """
-    mfe = dg(rna_seq)
+    if fold is None:
+        return "Error: seqfold is not installed"
+
+    # Fold once and derive the MFE from the structures, as seqfold's dg() does
     structs = fold(rna_seq)
+    mfe = round(sum(s.e for s in structs), 2)
     dot_bracket_structure = dot_bracket(rna_seq, structs)
 
     return f"Minimum Free Energy (MFE): `{mfe}`\nDot-Bracket Structure: `{dot_bracket_structure}`"
@@ -394,10 +457,9 @@ test_data["predict_rna_secondary_structure"] = {
 
 
 
+@register
 def predict_logp_from_smiles(self, smiles: str):
-    from rdkit import Chem
-    from rdkit.Chem import Crippen
-    mol = Chem.MolFromSmiles(smiles)
+    mol = mol_from_smiles(smiles)
     if mol is None:
         return "Invalid SMILES string"
     logp = Crippen.MolLogP(mol)
@@ -426,17 +488,77 @@ test_data["predict_logp_from_smiles"] = {
     "output": "The predicted logP value for the molecule CCO is 0.4605",  # Example output
 }
 
+
+# Column names of the property table as get_smiles_feature labels them
+_PROPERTY_LABELS = {
+    "MW": "Molecular Weight",
+    "LOGP": "LOGP",
+    "HBA": "HBA (Hydrogen Bond Acceptors)",
+    "HBD": "HBD (Hydrogen Bond Donors)",
+    "PSA": "PSA (Polar Surface Area)",
+    "ROTB": "ROTB (Rotatable Bonds)",
+    "AROM": "AROM (Aromatic Rings)",
+}
+
+
+@register
+def read_mol_property_table(self, table_key: str, max_rows: int = 20):
+    rows = redis_table_reader(table_key)
+    if rows is None:
+        return "Error: Could not read the molecule property table from redis cache"
+    lines = []
+    for row in rows[:max_rows]:
+        fields = [f"Molecule: {row.pop('Molecule')}"]
+        for name, value in row.items():
+            label = _PROPERTY_LABELS.get(name, name)
+            fields.append(f"{label}: {value:.2f}" if isinstance(value, float) else f"{label}: {value}")
+        lines.append(", ".join(fields))
+    if len(rows) > max_rows:
+        lines.append(f"... {len(rows) - max_rows} more rows not shown")
+    return "\n".join(lines)
+
+function_descriptions.append({
+    "type": "function",
+    "function": {
+        "name": "read_mol_property_table",
+        "description": "Read back a molecule property table saved in Redis cache by \
+                        calculate_mol_properties, one molecule per line with its properties",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "table_key": {"type": "string", "description": "Redis key of the property table"},
+                "max_rows": {"type": "integer", "description": "Most rows to return, 20 if not provided"},
+            },
+        },
+        "required": ["table_key"],
+    },
+})
+
+test_data["read_mol_property_table"] = {
+    "input": {
+        "self": None,
+        "table_key": "mol_property_table",
+        "max_rows": 1,
+    },
+    "output": "Molecule: C[C@H](N)C(=O)N[C@@H](CS)C(=O)N[C@@H](CS)C(=O)O, Molecular Weight: 295.39, \
+LOGP: -1.75, HBA (Hydrogen Bond Acceptors): 5, HBD (Hydrogen Bond Donors): 6, \
+PSA (Polar Surface Area): 121.52, ROTB (Rotatable Bonds): 7, AROM (Aromatic Rings): 0",
+}
+
 ### DO NOT MODIFY BELOW THIS LINE ###
 def get_all_functions():
-    all_functions = []
-    global_functions = globals()
-    for _, func in global_functions.items():
-        if isinstance(func, types.FunctionType):
-            all_functions.append(func)
-    return all_functions
+    return list(_REGISTRY)
 
+@functools.lru_cache(maxsize=1)
 def get_info():
-    return {"functions": get_all_functions(), "descriptions": function_descriptions}
+    # Pair functions with descriptions by name, so a description whose
+    # function was not registered fails here instead of shifting the rest
+    registry = {func.__name__: func for func in get_all_functions()}
+    names = [description["function"]["name"] for description in function_descriptions]
+    missing = [name for name in names if name not in registry]
+    if missing:
+        raise LookupError(f"Described functions not decorated with @register: {missing}")
+    return {"functions": [registry[name] for name in names], "descriptions": function_descriptions}
 
 def test_new_function(function, function_name, test_data):
     return (
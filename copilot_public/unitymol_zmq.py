@@ -13,12 +13,24 @@ It provides functions to send commands and receive responses.
 __version__ = "0.1.0"
 
 import zmq
-import json
+try:
+    # orjson parses straight from the reply bytes and is faster than json
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
 import logging
 import re
+import itertools
+import threading
+import uuid
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 
 unitymol = None
 
+# Patterns used by _clean_text, compiled once
+_TAG_RE = re.compile(r'<[^>]+>')
+_WS_RE = re.compile(r'\s+')
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -48,6 +60,13 @@ class UnityMolZMQ:
         self.context = zmq.Context.instance()
         self.socket = None
         self.connected = False
+        # Pipelining state: replies are matched to futures by request id
+        self._req_ids = itertools.count()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._poller = None
+        self._outbox = None
+        self._io_thread = None
         
     def connect(self, timeout=10):
         """
@@ -59,24 +78,31 @@ class UnityMolZMQ:
         Returns:
             bool: True if connection was successful, False otherwise
         """
+        if self.socket:
+            self.disconnect()
+
         try:
-            self.socket = self.context.socket(zmq.REQ)
+            # DEALER lets several commands be in flight; UnityMol's REP
+            # server echoes the request id frame back with each reply
+            self.socket = self.context.socket(zmq.DEALER)
             self.socket.setsockopt(zmq.LINGER, 0)  # Don't block at the end
+            self.socket.setsockopt(zmq.IDENTITY, f"chatmol-{uuid.uuid4().hex}".encode())
             self.socket.connect(f"tcp://{self.host}:{self.port}")
 
             # Send a test message
-            self.socket.send_string("import sys")
+            self.socket.send_multipart([b"", b"import sys"])
 
            # Poll the socket with timeout
-            poller = zmq.Poller()
-            poller.register(self.socket, zmq.POLLIN)
-            socks = dict(poller.poll(timeout * 1000))  # Timeout in milliseconds
+            self._poller = zmq.Poller()
+            self._poller.register(self.socket, zmq.POLLIN)
+            socks = dict(self._poller.poll(timeout * 1000))  # Timeout in milliseconds
 
             if socks.get(self.socket) == zmq.POLLIN:
-                reply = json.loads(self.socket.recv().decode())
+                reply = _json_loads(self.socket.recv_multipart()[-1])
 
                 if reply['success']:
                     self.connected = True
+                    self._start_io_thread()
                     logger.info(f"server connected OK to tcp://{self.host}:{self.port}.\n")
                     return True
                 else:
@@ -87,6 +113,9 @@ class UnityMolZMQ:
         except zmq.error.ZMQError as e:
             logger.error(f"Failed to connect to UnityMol ZMQ server: {e}\n")
 
+        if self.socket:
+            self.socket.close()
+            self.socket = None
         self.connected = False
         return False
     
@@ -95,10 +124,94 @@ class UnityMolZMQ:
         Close the connection to UnityMol's ZMQ server.
         """
         if self.socket:
+            self._stop_io_thread()
             self.socket.close()
+            self.socket = None
             self.connected = False
             logger.info("Disconnected from UnityMol ZMQ server")
 
+    def _start_io_thread(self):
+        """
+        Hand the socket over to a background thread that sends queued
+        commands and resolves their futures as replies arrive.
+        """
+        endpoint = f"inproc://unitymol-{id(self)}"
+        self._outbox = self.context.socket(zmq.PAIR)
+        self._outbox.bind(endpoint)
+        inbox = self.context.socket(zmq.PAIR)
+        inbox.connect(endpoint)
+        self._poller.register(inbox, zmq.POLLIN)
+        self._io_thread = threading.Thread(
+            target=self._io_loop, args=(inbox,), name="UnityMolZMQ-io", daemon=True
+        )
+        self._io_thread.start()
+
+    def _stop_io_thread(self):
+        """
+        Stop the background thread; an empty frame is the stop signal.
+        """
+        if self._io_thread is None:
+            return
+        # The outbox is shared with send_command_async, so send under the lock
+        with self._lock:
+            try:
+                # Don't block if the thread already exited and closed its end
+                self._outbox.send_multipart([b""], zmq.NOBLOCK)
+            except zmq.error.Again:
+                pass
+        self._io_thread.join()
+        self._outbox.close()
+        self._outbox = None
+        self._io_thread = None
+
+    def _io_loop(self, inbox):
+        """
+        Only this thread touches the DEALER socket once connected.
+        """
+        try:
+            while True:
+                events = dict(self._poller.poll())
+                if inbox in events:
+                    frames = inbox.recv_multipart()
+                    if not frames[0]:
+                        break
+                    self.socket.send_multipart(frames)
+                if self.socket in events:
+                    self._resolve_reply(self.socket.recv_multipart())
+        except Exception as e:
+            logger.exception(f"UnityMol I/O thread failed: {e}")
+
+        self._poller.unregister(inbox)
+        inbox.close()
+        # Stopped or failed, nothing will answer the pending commands now
+        with self._lock:
+            self.connected = False
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if future.set_running_or_notify_cancel():
+                future.set_exception(ConnectionError("Disconnected from UnityMol ZMQ server"))
+
+    def _resolve_reply(self, frames):
+        """
+        Hand a [req_id, '', response] reply to the future waiting for it.
+        """
+        if len(frames) != 3:
+            logger.warning(f"Dropping malformed reply with {len(frames)} frames")
+            return
+        req_id, _, response = frames
+        with self._lock:
+            future = self._pending.pop(req_id, None)
+        if future is None:
+            logger.warning(f"Dropping reply for unknown request {req_id!r}")
+            return
+        # False if the caller cancelled it; once running it can't be cancelled
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(self._parse_response(response))
+        except Exception as e:
+            future.set_exception(e)
+
     def send_command_clean(self, command):
         """
         Sends a command and returns the cleaned text response.
@@ -134,22 +247,60 @@ class UnityMolZMQ:
 Cleans the text by removing HTML-like tags and specific substrings.
 """
         # Remove HTML-like tags
-        text = re.sub(r'<[^>]+>', '', text)
+        text = _TAG_RE.sub('', text)
         # Remove specific substrings like [Log]
         text = text.replace('[Log]', '')
         # Remove specific substrings like [Log]
         text = text.replace('>>>', '')
         # Normalize whitespace
-        text = re.sub(r'\s+', ' ', text).strip()
+        text = _WS_RE.sub(' ', text).strip()
         return text
 
 
-    def send_command(self, command):
+    def send_command_async(self, command):
+        """
+        Queue a command for UnityMol without waiting for its reply.
+
+        Args:
+            command (str): The UnityMol API command to execute
+
+        Returns:
+            Future: Resolves to the same dictionary send_command returns
+
+        Raises:
+            ConnectionError: If not connected to UnityMol
+        """
+        return self._queue_command(command)[1]
+
+    def _queue_command(self, command):
+        """
+        Register a future for the command and hand it to the I/O thread.
+
+        Returns:
+            tuple: The request id and the future waiting for its reply
+        """
+        if not self.connected:
+            if not self.connect():
+                raise ConnectionError("Not connected to UnityMol ZMQ server")
+
+        future = Future()
+        logger.debug(f"Sending command: {command}")
+        with self._lock:
+            # The I/O thread may have failed since the check above
+            if not self.connected:
+                raise ConnectionError("Not connected to UnityMol ZMQ server")
+            req_id = str(next(self._req_ids)).encode()
+            self._pending[req_id] = future
+            self._outbox.send_multipart([req_id, b"", command.encode()])
+        return req_id, future
+
+    def send_command(self, command, timeout=None):
         """
         Send a command to UnityMol and receive the response.
         
         Args:
             command (str): The UnityMol API command to execute
+            timeout (float): Seconds to wait for the reply, None waits forever
             
         Returns:
             dict: A dictionary containing the response with keys:
@@ -162,37 +313,40 @@ Cleans the text by removing HTML-like tags and specific substrings.
             TimeoutError: If the command times out
             ValueError: If the response is not valid JSON
         """
-        if not self.connected:
-            if not self.connect():
-                raise ConnectionError("Not connected to UnityMol ZMQ server")
-        
         try:
-            logger.debug(f"Sending command: {command}")
-            self.socket.send_string(command)
-            response = self.socket.recv().decode()
-            
-            try:
-                # Try to parse as JSON
-                result = json.loads(response)
-                logger.debug(f"Received response: {result}")
-                return result
-            except json.JSONDecodeError:
-                # If not valid JSON, create a simple result structure
-                logger.warning(f"Received non-JSON response: {response}")
-                # Handle the case where response is just "True" or "False"
-                if response.strip().lower() == "true":
-                    return {"success": True, "result": "Command succeeded", "stdout": ""}
-                elif response.strip().lower() == "false":
-                    return {"success": False, "result": "", "stdout": "Command failed"}
-                else:
-                    return {"success": True, "result": response, "stdout": ""}
-                
-        except zmq.error.Again:
+            req_id, future = self._queue_command(command)
+            return future.result(timeout)
+        except FutureTimeoutError:
+            # A late reply is then dropped instead of finding a cancelled future
+            with self._lock:
+                self._pending.pop(req_id, None)
+            future.cancel()
             logger.error("Command timed out")
             raise TimeoutError("Command to UnityMol timed out")
         except Exception as e:
             logger.error(f"Error sending command: {e}")
             raise
+
+    def _parse_response(self, response_bytes):
+        """
+        Turn a raw UnityMol reply into the result dictionary.
+        """
+        try:
+            # Try to parse as JSON
+            result = _json_loads(response_bytes)
+            logger.debug(f"Received response: {result}")
+            return result
+        except ValueError:
+            # If not valid JSON, create a simple result structure
+            response = response_bytes.decode()
+            logger.warning(f"Received non-JSON response: {response}")
+            # Handle the case where response is just "True" or "False"
+            if response.strip().lower() == "true":
+                return {"success": True, "result": "Command succeeded", "stdout": ""}
+            elif response.strip().lower() == "false":
+                return {"success": False, "result": "", "stdout": "Command failed"}
+            else:
+                return {"success": True, "result": response, "stdout": ""}
     
     def test_connection(self):
         """